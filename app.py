@@ -2,13 +2,15 @@
 # Imports at the top - Full Shiny Version
 # --------------------------------------------
 
-from shiny import App, ui, reactive, render
+from shiny import App, ui, reactive, render, req
+import asyncio
 import random
+import threading
 from datetime import datetime
-import pandas as pd
-from plotly import express as px
-from scipy.stats import linregress
-from collections import deque
+import numpy as np
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+from plotly.offline import get_plotlyjs_version
 
 # --------------------------------------------
 # SET UP THE REACTIVE CONTENT
@@ -16,39 +18,164 @@ from collections import deque
 
 UPDATE_INTERVAL_SECS: int = 1
 
-# Simulated deque for storing data and a DataFrame for plotting
-MAX_DEQUE_LENGTH = 100  # Store up to 100 entries
-temp_deque = deque(maxlen=MAX_DEQUE_LENGTH)
+# Ring buffer of recent readings for plotting, one array per field
+MAX_HISTORY_LENGTH = 100  # Store up to 100 entries
+history_temps = np.empty(MAX_HISTORY_LENGTH, dtype=np.int16)  # Tenths of a degree
+history_times = np.empty(MAX_HISTORY_LENGTH, dtype="datetime64[s]")
+history_head = 0  # Next slot to write
+history_count = 0  # Number of readings stored
+
+# Running sums for the regression line, in whole tenths of a degree, with x as
+# each reading's position (0 for the oldest). Integers keep them exact however
+# many readings are added and removed.
+history_sum_y = 0
+history_sum_xy = 0
+
+
+def append_reading(tenths, timestamp):
+    """Store a reading, overwriting the oldest once the buffer is full."""
+    global history_head, history_count, history_sum_y, history_sum_xy
+    if history_count == MAX_HISTORY_LENGTH:
+        # Drop the oldest reading; the rest each move down one position
+        history_sum_y -= int(history_temps[history_head])
+        history_sum_xy -= history_sum_y
+        history_count -= 1
+
+    history_temps[history_head] = tenths
+    history_times[history_head] = timestamp
+    history_sum_y += tenths
+    history_sum_xy += history_count * tenths
+
+    history_head = (history_head + 1) % MAX_HISTORY_LENGTH
+    history_count += 1
+
+
+def fit_line():
+    """Return (slope, intercept) of the stored readings, or None if too few."""
+    n = history_count
+    if n < 2:
+        return None
+    # Everything stays an exact integer until the final divisions
+    sum_x = n * (n - 1) // 2
+    sum_xx = (n - 1) * n * (2 * n - 1) // 6
+    slope = (n * history_sum_xy - sum_x * history_sum_y) / (n * sum_xx - sum_x**2)
+    intercept = (history_sum_y - slope * sum_x) / n
+    return slope / 10, intercept / 10
+
+
+def ordered_history():
+    """Return copies of the stored temperatures and times, oldest first."""
+    if history_count < MAX_HISTORY_LENGTH:
+        return (
+            history_temps[:history_count].copy(),
+            history_times[:history_count].copy(),
+        )
+    return (
+        np.concatenate((history_temps[history_head:], history_temps[:history_head])),
+        np.concatenate((history_times[history_head:], history_times[:history_head])),
+    )
+
+
+# Readings are whole tenths of a degree from -18.0 to -16.0 °C
+MIN_TEMP_TENTHS = -180
+MAX_TEMP_TENTHS = -160
+TEMP_TENTHS = range(MIN_TEMP_TENTHS, MAX_TEMP_TENTHS + 1)
+
+# Conversion from Celsius for each unit: (scale, offset, suffix)
+UNIT_TABLE = {
+    "Celsius": (1.0, 0.0, "°C"),
+    "Fahrenheit": (1.8, 32.0, "°F"),
+    "Kelvin": (1.0, 273.15, "K"),
+}
+
+# Every display string is built once, keyed by unit then tenths of a degree
+TEMP_STRINGS = {
+    temp_unit: {t: f"{t / 10 * scale + offset:.1f} {suffix}" for t in TEMP_TENTHS}
+    for temp_unit, (scale, offset, suffix) in UNIT_TABLE.items()
+}
+
+
+# Latest (temperature, timestamp) reading; None until the first one arrives
+latest_sample = reactive.value(None)
+
+# Last distinct temperature in tenths of a degree; only changes when a new
+# reading differs
+latest_tenths = reactive.value(None)
+
+# Sessions currently connected, and the task taking readings for them
+active_sessions = 0
+sampler_task = None
+
+
+async def run_sampler():
+    """Take one shared reading per interval while any session is connected."""
+    while active_sessions > 0:
+        # Simulate a new temperature reading, stamped once with the current time
+        tenths = random.randint(MIN_TEMP_TENTHS, MAX_TEMP_TENTHS)
+        timestamp = datetime.now()
+
+        async with reactive.lock():
+            # Store the reading under the lock, so a flush still in progress
+            # never sees a buffer ahead of latest_sample
+            append_reading(tenths, np.datetime64(timestamp, "s"))
+            latest_sample.set((tenths, timestamp))
+            # Identical readings don't re-render the temperature outputs
+            with reactive.isolate():
+                if tenths != latest_tenths.get():
+                    latest_tenths.set(tenths)
+            await reactive.flush()
+
+        await asyncio.sleep(UPDATE_INTERVAL_SECS)
+
+
+def start_sampler(session):
+    """Count a new session and start the sampler if it isn't running."""
+    global active_sessions, sampler_task
+    active_sessions += 1
+
+    def session_ended():
+        global active_sessions
+        active_sessions -= 1
+
+    session.on_ended(session_ended)
+    if sampler_task is None or sampler_task.done():
+        sampler_task = asyncio.create_task(run_sampler())
 
 
 @reactive.calc()
-def reactive_calc_combined():
-    # Simulate temperature and time
-    reactive.invalidate_later(UPDATE_INTERVAL_SECS)
-    temp = round(random.uniform(-18, -16), 1)
-    timestamp = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+def reactive_time():
+    # Timestamps are kept as datetimes and only formatted here for display
+    sample = latest_sample()
+    req(sample is not None)
+    _, timestamp = sample
+    return timestamp.strftime("%d-%m-%Y %H:%M:%S")
 
-    # Add the new data to the deque
-    temp_deque.append({"temp": temp, "timestamp": timestamp})
 
-    # Convert to DataFrame for plotting
-    df = pd.DataFrame(temp_deque)
-
-    # Latest dictionary entry
-    latest_dictionary_entry = {"temp": temp, "timestamp": timestamp}
-    return temp_deque, df, latest_dictionary_entry
+@reactive.calc()
+def reactive_history():
+    # The sampler has already stored the reading; snapshot it for plotting
+    req(latest_sample() is not None)
+    temps, times = ordered_history()
+    return temps, times, fit_line()
 
 
 # ------------------------------------------------
 # Define the Shiny UI Layout Using page_sidebar()
 # ------------------------------------------------
 
-# Add Font Awesome CSS to the app
-font_awesome_css = ui.tags.head(
+# Add Font Awesome, Plotly.js and the page stylesheet to the page head
+head_assets = ui.head_content(
+    # Load the icons without blocking first paint: the stylesheet is fetched
+    # as "print" and switched to "all" once it has arrived
     ui.tags.link(
         rel="stylesheet",
         href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css",
+        media="print",
+        onload="this.media='all'",
     ),
+    # Load the plotly.js release that the installed plotly targets, so the
+    # figure JSON built on the server always matches the browser's library
+    ui.tags.script(src=f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"),
     ui.tags.style(
         """
         .location-container, .message-container {
@@ -58,6 +185,7 @@ font_awesome_css = ui.tags.head(
         }
         .location-icon {
             margin-left: 8px;
+            color: white;
         }
         .temperature-box {
             background: linear-gradient(to right, #d3d3d3, #808080); /* Gradient grey */
@@ -71,6 +199,12 @@ font_awesome_css = ui.tags.head(
             font-size: 1.2em; /* Smaller icon size */
             margin-left: 5px;
         }
+        .heatwave-icon {
+            color: red;
+        }
+        .cold-icon {
+            color: blue;
+        }
         .datetime-box {
             background: linear-gradient(to right, #98fb98, #228b22); /* Green gradient */
             color: white;
@@ -86,7 +220,6 @@ font_awesome_css = ui.tags.head(
 
 # Create the sidebar using ui.sidebar()
 sidebar = ui.sidebar(
-    font_awesome_css,  # Include Font Awesome CSS and custom styling
     ui.h2("Antarctic Explorer", class_="text-center"),
     ui.p(
         "A demonstration of real-time temperature readings in Antarctica in Celsius, Fahrenheit, or Kelvin.",
@@ -103,22 +236,46 @@ sidebar = ui.sidebar(
     ui.input_radio_buttons(
         id="temp_unit",
         label="Select Temperature Unit:",
-        choices=["Celsius", "Fahrenheit", "Kelvin"],
+        choices=list(UNIT_TABLE),
         selected="Celsius",
     ),
     # Add Current Date and Time in a green gradient box
     ui.div(
         [
             ui.div("Current Date and Time", class_="text-bold"),  # Header text
-            ui.output_text("display_time"),  # Reactive timestamp
+            ui.div(id="display_time"),  # Timestamp, set by the tick message
         ],
         class_="datetime-box",
     ),
 )
 
+# The regression line's end points can overshoot the readings by up to a third
+# of their range when there are only a few of them, so the axis leaves room for
+# that as well as for the markers
+TREND_AXIS_PADDING = (MAX_TEMP_TENTHS - MIN_TEMP_TENTHS) / 10 / 3 + 0.25
+
+# Chart layout, the same for every session, so it is built once and sent with
+# the page rather than with each full redraw
+TREND_LAYOUT_JSON = to_json_plotly(
+    go.Figure(
+        layout=dict(
+            title="Temperature Readings with Regression Line",
+            xaxis_title="Time",
+            yaxis_hoverformat=".2f",
+            # Nothing drawn can leave this range, so fix the axis rather than
+            # have Plotly rescale it on every new point
+            yaxis_range=[
+                MIN_TEMP_TENTHS / 10 - TREND_AXIS_PADDING,
+                MAX_TEMP_TENTHS / 10 + TREND_AXIS_PADDING,
+            ],
+        )
+    ).to_dict()["layout"]
+)
+
 # Define the full page layout correctly
 app_ui = ui.page_sidebar(
     sidebar,
+    head_assets,  # Icons, chart library and stylesheet
     # Place Location and Current Temperature side by side
     ui.layout_columns(
         ui.value_box(
@@ -133,8 +290,8 @@ app_ui = ui.page_sidebar(
             title="Current Temperature",
             value=ui.div(
                 [
-                    ui.output_text("display_temp"),  # Temperature value
-                    ui.output_ui("temp_message"),  # Conditional message with icon
+                    ui.div(id="display_temp"),  # Temperature value
+                    ui.div(id="temp_message"),  # Conditional message with icon
                 ],
                 class_="temperature-box",  # Gradient gray styling
             ),
@@ -145,159 +302,327 @@ app_ui = ui.page_sidebar(
     # Add the card with the temperature chart
     ui.card(
         ui.card_header("Chart with Current Trend"),
-        ui.output_ui("display_plot"),  # Plotly chart as HTML
+        ui.div(id="trend-plot", style="min-height: 450px;"),  # Drawn in the browser
+        ui.tags.script(f"var trendLayout = {TREND_LAYOUT_JSON};"),
+        ui.tags.script(
+            """
+            // Tell the server whether the chart can be seen, so it can skip
+            // updates while it is scrolled away or the tab is in the background
+            $(document).on("shiny:connected", function () {
+                var onScreen = true;
+                function report() {
+                    Shiny.setInputValue("trend_visible", onScreen && !document.hidden);
+                }
+                new IntersectionObserver(function (entries) {
+                    onScreen = entries[0].isIntersecting;
+                    report();
+                }).observe(document.getElementById("trend-plot"));
+                document.addEventListener("visibilitychange", report);
+                report();
+            });
+            // Celsius y values of both traces, and the unit they are shown in
+            var trendCelsius = [[], []];
+            var trendRange = null;
+            var trendUnit = { scale: 1, offset: 0, label: "Temperature (°C)" };
+            function inTrendUnit(values) {
+                return values.map(function (c) {
+                    return c * trendUnit.scale + trendUnit.offset;
+                });
+            }
+            function trendHover() {
+                return "Time=%{x}<br>" + trendUnit.label + "=%{y}<extra></extra>";
+            }
+            // Draw the full chart from the traces sent on first load
+            Shiny.addCustomMessageHandler("trend_reset", function (msg) {
+                var data = JSON.parse(msg.data);
+                var layout = JSON.parse(JSON.stringify(trendLayout));
+                trendCelsius = data.map(function (trace) { return trace.y; });
+                data.forEach(function (trace, i) {
+                    trace.y = inTrendUnit(trendCelsius[i]);
+                });
+                data[0].hovertemplate = trendHover();
+                trendRange = layout.yaxis.range;
+                layout.yaxis.range = inTrendUnit(trendRange);
+                layout.yaxis.title = { text: trendUnit.label };
+                Plotly.react("trend-plot", data, layout);
+            });
+            // Append the newest reading and move the regression line
+            Shiny.addCustomMessageHandler("trend_extend", function (msg) {
+                trendCelsius[0].push(msg.y);
+                if (trendCelsius[0].length > msg.max_points) {
+                    trendCelsius[0].shift();
+                }
+                trendCelsius[1] = msg.fit_y;
+                Plotly.extendTraces(
+                    "trend-plot",
+                    { x: [[msg.x]], y: [inTrendUnit([msg.y])] },
+                    [0],
+                    msg.max_points
+                );
+                Plotly.restyle(
+                    "trend-plot", { x: [msg.fit_x], y: [inTrendUnit(msg.fit_y)] }, [1]
+                );
+            });
+            // Switch units by rescaling the data already in the browser
+            Shiny.addCustomMessageHandler("trend_unit", function (msg) {
+                trendUnit = msg;
+                var plot = document.getElementById("trend-plot");
+                if (plot.data) {
+                    Plotly.update(
+                        plot,
+                        {
+                            y: trendCelsius.map(inTrendUnit),
+                            // Only the readings carry the unit in their hover
+                            hovertemplate: [trendHover(), undefined],
+                        },
+                        {
+                            "yaxis.title.text": msg.label,
+                            "yaxis.range": inTrendUnit(trendRange),
+                        },
+                        [0, 1]
+                    );
+                }
+            });
+            """
+        ),
+    ),
+    # Apply each tick's text updates, which arrive together in one message
+    ui.tags.script(
+        """
+        Shiny.addCustomMessageHandler("tick", function (msg) {
+            if ("temp" in msg) {
+                document.getElementById("display_temp").textContent = msg.temp;
+            }
+            if ("time" in msg) {
+                document.getElementById("display_time").textContent = msg.time;
+            }
+            if ("message" in msg) {
+                document.getElementById("temp_message").innerHTML = msg.message;
+            }
+        });
+        """
     ),
 )
 
+# Location markup with a flag icon, built once for each location
+LOCATION_HTML = {
+    "Palmer Station": ui.HTML(
+        """
+        <div class="location-container">
+            <span>Palmer Station</span>
+            <i class="fa-solid fa-flag-usa location-icon"></i>
+        </div>
+        """
+    ),
+    "Port Lockroy": ui.HTML(
+        """
+        <div class="location-container">
+            <span>Port Lockroy</span>
+            <i class="fa-solid fa-flag-checkered location-icon"></i>
+        </div>
+        """
+    ),
+    "Yelcho Base": ui.HTML(
+        """
+        <div class="location-container">
+            <span>Yelcho Base</span>
+            <i class="fa-regular fa-flag location-icon"></i>
+        </div>
+        """
+    ),
+}
+
+# Temperature messages are sent as markup in the tick message, so keep them
+# as ready-made strings rather than rendering a ui.HTML on every tick
+# Micro Heatwave with smaller red sun icon
+HEATWAVE_HTML = (
+    '<div class="message-container"><span>Micro Heatwave  </span>'
+    '<i class="fa-regular fa-sun message-icon heatwave-icon"></i></div>'
+)
+
+# Could be Warmer with smaller blue snowflake icon
+COLD_HTML = (
+    '<div class="message-container"><span>Could be Warmer  </span>'
+    '<i class="fa-solid fa-snowflake message-icon cold-icon"></i></div>'
+)
+
+
+# Module-level calcs are shared by every session, so each tick does one
+# lookup per unit in use rather than one per connected session
+def make_temp_text(temp_unit):
+    @reactive.calc()
+    def temp_text():
+        tenths = latest_tenths()
+        req(tenths is not None)
+        return TEMP_STRINGS[temp_unit][tenths]
+
+    return temp_text
+
+
+temp_text_by_unit = {temp_unit: make_temp_text(temp_unit) for temp_unit in TEMP_STRINGS}
+
+
+@reactive.calc()
+def temp_message_html():
+    tenths = latest_tenths()
+    req(tenths is not None)
+    return HEATWAVE_HTML if tenths > -170 else COLD_HTML
+
+
+# ------------------------------------------------
+# Build the Trend Chart Data
+# ------------------------------------------------
+
+# The chart is kept in Celsius; the browser converts it for the selected unit
+TREND_UNITS = {
+    temp_unit: {"scale": scale, "offset": offset, "label": f"Temperature ({suffix})"}
+    for temp_unit, (scale, offset, suffix) in UNIT_TABLE.items()
+}
+
+
+def regression_line(times, fit):
+    """Return the x and y end points of the regression line."""
+    if fit is None:
+        return [], []
+    slope, intercept = fit
+    return (
+        [str(times[0]), str(times[-1])],
+        [round(intercept, 3), round(slope * (len(times) - 1) + intercept, 3)],
+    )
+
+
+def build_trend_data(temps, times, fit):
+    """Build both chart traces in Celsius, sent when a client first draws."""
+    # Plain lists keep the y values readable by the browser, which converts
+    # them to the selected unit
+    fit_x, fit_y = regression_line(times, fit)
+    traces = [
+        # Scatter plot for readings, drawn with WebGL so it stays cheap to
+        # render as points are added
+        go.Scattergl(
+            x=times,
+            y=(temps / 10).tolist(),
+            mode="markers",
+            marker_color="blue",
+            showlegend=False,
+        ),
+        # Regression line
+        go.Scatter(x=fit_x, y=fit_y, mode="lines", name="Regression Line"),
+    ]
+    return to_json_plotly([trace.to_plotly_json() for trace in traces])
+
+
+# Last trace data built and the history snapshot it came from, so sessions
+# drawing from the same snapshot share one build. Builds run in worker threads,
+# so the lock stops two sessions from building the same snapshot at once.
+trend_data_cache = (None, None)
+trend_data_lock = threading.Lock()
+
+
+def trend_data_json(history):
+    """Return the chart traces as JSON, building them once per snapshot."""
+    global trend_data_cache
+    with trend_data_lock:
+        cached_history, data_json = trend_data_cache
+        if cached_history is not history:
+            data_json = build_trend_data(*history)
+            trend_data_cache = (history, data_json)
+    return data_json
+
+
+def trend_delta(temps, times, fit):
+    """Return the newest reading and regression line for the client to apply."""
+    fit_x, fit_y = regression_line(times, fit)
+    return {
+        "x": str(times[-1]),
+        "y": int(temps[-1]) / 10,
+        "fit_x": fit_x,
+        "fit_y": fit_y,
+        "max_points": MAX_HISTORY_LENGTH,
+    }
+
+
 # ------------------------------------------------
 # Define the Server Logic
 # ------------------------------------------------
 
 
 def server(input, output, session):
-    @output
-    @render.text
-    def display_temp():
-        """Get the latest reading and return a temperature string"""
-        _, _, latest_dictionary_entry = reactive_calc_combined()
-        temp_celsius = latest_dictionary_entry["temp"]
-
-        # Check the radio button value to determine the unit
-        if input.temp_unit() == "Fahrenheit":
-            temp_fahrenheit = round((temp_celsius * 9 / 5) + 32, 1)
-            return f"{temp_fahrenheit} °F"
-        elif input.temp_unit() == "Kelvin":
-            temp_kelvin = round(temp_celsius + 273.15, 1)
-            return f"{temp_kelvin} K"
-        else:
-            return f"{temp_celsius} °C"
-
-    @output
-    @render.text
-    def display_time():
-        """Get the latest reading and return a timestamp string"""
-        _, _, latest_dictionary_entry = reactive_calc_combined()
-        return f"{latest_dictionary_entry['timestamp']}"
+    start_sampler(session)
+
+    # Values last sent in a tick message, so unchanged ones are left out
+    sent_tick = {}
+
+    @reactive.effect
+    async def send_tick():
+        """Send the temperature, time and message together in one message."""
+        tick = {
+            "temp": temp_text_by_unit[input.temp_unit()](),
+            "time": reactive_time(),
+            "message": temp_message_html(),
+        }
+        changed = {
+            key: value for key, value in tick.items() if sent_tick.get(key) != value
+        }
+        sent_tick.update(changed)
+        await session.send_custom_message("tick", changed)
 
     @output
     @render.ui
     def display_location_with_icon():
         """Display the selected location with a flag icon."""
-        location = input.location()
-        if location == "Palmer Station":
-            return ui.HTML(
-                f"""
-                <div class="location-container">
-                    <span>{location}</span>
-                    <i class="fa-solid fa-flag-usa location-icon" style="color: white;"></i>
-                </div>
-                """
-            )
-        elif location == "Port Lockroy":
-            return ui.HTML(
-                f"""
-                <div class="location-container">
-                    <span>{location}</span>
-                    <i class="fa-solid fa-flag-checkered location-icon" style="color: white;"></i>
-                </div>
-                """
-            )
-        elif location == "Yelcho Base":
-            return ui.HTML(
-                f"""
-                <div class="location-container">
-                    <span>{location}</span>
-                    <i class="fa-regular fa-flag location-icon" style="color: white;"></i>
-                </div>
-                """
-            )
-        return ui.HTML(location)
-
-    @output
-    @render.ui
-    def temp_message():
-        """Return a message with an icon based on the current temperature."""
-        _, _, latest_dictionary_entry = reactive_calc_combined()
-        temp_celsius = latest_dictionary_entry["temp"]
-
-        if temp_celsius > -17:
-            # Micro Heatwave with smaller red sun icon
-            return ui.HTML(
-                f"""
-                <div class="message-container">
-                    <span>Micro Heatwave  </span>
-                    <i class="fa-regular fa-sun message-icon" style="color: red;"></i>
-                </div>
-                """
-            )
-        else:
-            # Could be Warmer with smaller blue snowflake icon
-            return ui.HTML(
-                f"""
-                <div class="message-container">
-                    <span>Could be Warmer  </span>
-                    <i class="fa-solid fa-snowflake message-icon" style="color: blue;"></i>
-                </div>
-                """
-            )
-
-    @output
-    @render.ui
-    def display_plot():
-        """Render the current trend of temperature readings."""
-        _, df, _ = reactive_calc_combined()
-
-        # Ensure the DataFrame is not empty before plotting
-        if not df.empty:
-            # Convert the 'timestamp' column to datetime for better plotting
-            df["timestamp"] = pd.to_datetime(
-                df["timestamp"], format="%d-%m-%Y %H:%M:%S"
-            )
-
-            # Check the selected temperature unit
-            temp_unit = input.temp_unit()
-
-            # Adjust the temperatures based on the selected unit
-            if temp_unit == "Fahrenheit":
-                df["temp"] = df["temp"] * 9 / 5 + 32
-                y_label = "Temperature (°F)"
-            elif temp_unit == "Kelvin":
-                df["temp"] = df["temp"] + 273.15
-                y_label = "Temperature (K)"
+        return LOCATION_HTML[input.location()]
+
+    # Chart messages are queued and sent from their own task, so building a
+    # figure never holds up the text outputs flushed alongside it
+    plot_messages = asyncio.Queue()
+
+    async def send_plot_messages():
+        while True:
+            message_type, make_message = await plot_messages.get()
+            if message_type == "trend_reset":
+                # Build full figures in a worker thread so the event loop
+                # keeps serving every other session meanwhile
+                message = await asyncio.to_thread(make_message)
             else:
-                y_label = "Temperature (°C)"
-
-            # Create scatter plot for readings
-            fig = px.scatter(
-                df,
-                x="timestamp",
-                y="temp",
-                title="Temperature Readings with Regression Line",
-                labels={"temp": y_label, "timestamp": "Time"},
-                color_discrete_sequence=["blue"],
-            )
-
-            # Linear regression - generate regression line
-            x_vals = range(len(df))
-            y_vals = df["temp"]
-            slope, intercept, _, _, _ = linregress(x_vals, y_vals)
-            df["best_fit_line"] = [slope * x + intercept for x in x_vals]
-
-            # Add the regression line to the figure
-            fig.add_scatter(
-                x=df["timestamp"],
-                y=df["best_fit_line"],
-                mode="lines",
-                name="Regression Line",
+                message = make_message()
+            await session.send_custom_message(message_type, message)
+
+    plot_sender = asyncio.create_task(send_plot_messages())
+    session.on_ended(plot_sender.cancel)
+
+    # Whether the client's chart holds the readings so far
+    plotted = False
+
+    @reactive.effect
+    def update_plot():
+        """Keep the client-side trend chart in step with the readings."""
+        nonlocal plotted
+        if not input.trend_visible():
+            # Returning before reading the history means hidden charts don't
+            # rerun on each tick; they are redrawn in full once shown again
+            plotted = False
+            return
+
+        history = reactive_history()
+
+        if not plotted:
+            # First draw: send every reading so far once
+            plotted = True
+            plot_messages.put_nowait(
+                (
+                    "trend_reset",
+                    lambda: {"data": trend_data_json(history)},
+                )
             )
+        else:
+            # Otherwise send only the newest reading and the regression line
+            plot_messages.put_nowait(("trend_extend", lambda: trend_delta(*history)))
 
-            # Update layout for better visualization
-            fig.update_layout(xaxis_title="Time", yaxis_title=y_label)
-
-            # Return the Plotly figure as HTML
-            return ui.HTML(fig.to_html(full_html=False))
-
-        return ui.HTML("<div>No data available for plotting.</div>")
+    @reactive.effect
+    async def send_trend_unit():
+        """Tell the client which unit to show the chart in."""
+        await session.send_custom_message("trend_unit", TREND_UNITS[input.temp_unit()])
 
 
 # ------------------------------------------------